@@ -4,11 +4,15 @@ Convert GeoGebra Asymptote to parameterized LINE_THICKNESS and DOT_THICKNESS.
 
 Usage:
     python ggb_to_param_asy.py input.asy > output.asy
+    python ggb_to_param_asy.py --batch exports/
 """
 
+import os
 import re
 import sys
 import argparse
+import multiprocessing
+from functools import partial
 from pathlib import Path
 
 DEFAULT_SIZE = "12cm"
@@ -45,17 +49,20 @@ HEADER_REMOVAL_RE = re.compile(
     flags=re.IGNORECASE
 )
 LINEWIDTH_RE = re.compile(r"linewidth\(\s*[\d.]+(?:pt)?\s*\)")
+# Arguments may nest parens, e.g. dot((cos(1),sin(1)), ds), and quoted labels
+# are skipped whole so a ";" inside one (e.g. "$B;C$" or LaTeX \;) is allowed;
+# an unquoted ";" still ends the statement, bounding the lazy repeat
 DOT_STYLE_RE = re.compile(
-    r"dot\(\s*(.*?)\s*,\s*(?:linewidth\([^)]*\)\s*\+\s*)?(?:dotstyle|ds|dp)\s*\)",
-    flags=re.DOTALL
+    r'dot\(\s*((?:"[^"]*"|[^;"])*?)\s*,\s*(?:linewidth\([^)]*\)\s*\+\s*)?(?:dotstyle|ds|dp)\s*\)'
 )
 
 # Negative lookahead prevents duplicating "pic, " if the command already has it
 DRAW_CMD_RE = re.compile(r"\b(filldraw|draw|dot|label|xaxis|yaxis|clip)\s*\(\s*(?!pic\s*,)")
+# Drops existing add(pic) calls; transform appends a single one at the end
+ADD_PIC_RE = re.compile(r"\badd\s*\(\s*pic\s*\)\s*;\s*")
 
 # Scrubs mathematical artifacts generated by GeoGebra
 INFINITY_RE = re.compile(r"^.*Infinity.*$\n?", flags=re.MULTILINE)
-BLANK_LINES_RE = re.compile(r"\n{3,}")
 
 
 def transform(
@@ -69,8 +76,12 @@ def transform(
     # Sanitize input to remove hidden non-breaking spaces (e.g., \xa0)
     text = text.replace('\xa0', ' ')
 
-    lsf_match = LSF_RE.search(text)
-    lsf_val = lsf_override.strip() if lsf_override else (lsf_match.group(1).strip() if lsf_match else "0.1")
+    # Only scan for the exported scale factor when it isn't overridden
+    if lsf_override:
+        lsf_val = lsf_override.strip()
+    else:
+        lsf_match = LSF_RE.search(text)
+        lsf_val = lsf_match.group(1).strip() if lsf_match else "0.1"
 
     header = HDR_TEMPLATE.format(
         lsf_val=lsf_val,
@@ -82,21 +93,51 @@ def transform(
 
     # Apply substitutions
     body = HEADER_REMOVAL_RE.sub("", text)
-    body = INFINITY_RE.sub("", body)
+    # Most exports have no Infinity or add(pic) at all; a substring probe is far
+    # cheaper than those regexes, which get no literal-prefix search from sre
+    if "Infinity" in body:
+        body = INFINITY_RE.sub("", body)
     body = LINEWIDTH_RE.sub("linewidth(LINE_THICKNESS)", body)
     body = DOT_STYLE_RE.sub(r"dot(\1, dotstyle)", body)
     body = DRAW_CMD_RE.sub(r"\1(pic, ", body)
     
     # Clean up redundant add(pic) calls and excess newlines
-    body = re.sub(r"\badd\s*\(\s*pic\s*\)\s*;\s*", "", body)
-    body = BLANK_LINES_RE.sub("\n\n", body).strip()
+    if "add" in body:
+        body = ADD_PIC_RE.sub("", body)
+    # Each replace() pass shortens every run of k newlines to about 2k/3, so this
+    # loops O(log k) times, all in C-level substring search
+    while "\n\n\n" in body:
+        body = body.replace("\n\n\n", "\n\n")
+    body = body.strip()
 
     return f"{header}\n{body}\n\nadd(pic);\n// created by ggbparse.py\n"
 
 
+class ConversionError(Exception):
+    """A batch input failed to convert; the message names the file."""
+
+
+def convert_file(path: Path, **options) -> Path:
+    """Convert one .asy file, writing the result next to it as .param.asy."""
+    out_path = path.with_suffix(".param.asy")
+    # Write beside the target and rename into place, so a worker killed mid-write
+    # (e.g. when the pool terminates after another file fails) never leaves a
+    # truncated .param.asy that later runs would skip
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    try:
+        out = transform(text=path.read_text(encoding="utf-8"), **options)
+        tmp_path.write_bytes(out.encode("utf-8"))
+        os.replace(tmp_path, out_path)
+    except Exception as e:
+        raise ConversionError(f"Error converting '{path}': {e}") from e
+    return out_path
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="Rewrite GeoGebra-exported .asy to use paramaterized thicknesses.")
-    parser.add_argument("input", type=Path, help="Input .asy filename")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("input", type=Path, nargs="?", help="Input .asy filename")
+    source.add_argument("-batch", "--batch", type=Path, metavar="DIR", help="Convert every .asy in DIR to a sibling .param.asy")
     parser.add_argument("-size", "--size", type=str, default=DEFAULT_SIZE, help=f"Figure size (default: {DEFAULT_SIZE})")
     parser.add_argument("-font", "--fontsize", type=float, default=DEFAULT_FONTSIZE, help=f"Base fontsize (default: {DEFAULT_FONTSIZE})")
     parser.add_argument("-lsf", "--lsf", type=str, default=DEFAULT_LSF, help="Override label scale factor")
@@ -104,19 +145,36 @@ def main() -> None:
     parser.add_argument("-dot", "--dot-thickness", type=str, default=str(DEFAULT_DOT_THICKNESS), help=f"DOT_THICKNESS (default: {DEFAULT_DOT_THICKNESS})")
 
     args = parser.parse_args()
+    options = dict(
+        fontsize=args.fontsize,
+        lsf_override=args.lsf,
+        line_thickness=args.line_thickness,
+        dot_thickness=args.dot_thickness,
+        size=args.size,
+    )
+
+    if args.batch is not None:
+        if not args.batch.is_dir():
+            sys.exit(f"Error: '{args.batch}' is not a directory")
+        # Skip our own outputs so re-running over a directory is idempotent
+        paths = sorted(p for p in args.batch.glob("*.asy") if not p.name.endswith(".param.asy"))
+        try:
+            with multiprocessing.Pool() as pool:
+                # imap reports finished outputs in order, up to the first failure
+                for out_path in pool.imap(partial(convert_file, **options), paths):
+                    print(out_path, file=sys.stderr)
+        except ConversionError as e:
+            sys.exit(str(e))
+        except Exception as e:
+            sys.exit(f"Error running batch over '{args.batch}': {e}")
+        return
 
     try:
         text: str = args.input.read_text(encoding="utf-8")
-        sys.stdout.write(
-            transform(
-                text=text,
-                fontsize=args.fontsize,
-                lsf_override=args.lsf,
-                line_thickness=args.line_thickness,
-                dot_thickness=args.dot_thickness,
-                size=args.size,
-            )
-        )
+        out = transform(text=text, **options)
+        # Encode once and bypass the text layer (no newline translation or
+        # per-line flushing); the result is a single buffered write
+        sys.stdout.buffer.write(out.encode("utf-8"))
     except Exception as e:
         sys.exit(f"Error reading '{args.input}': {e}")
 